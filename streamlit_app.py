@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 import requests
-from io import StringIO
-from datetime import datetime
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+from datetime import datetime, timedelta
 import numpy as np
 
 # -------------------------------------------------------
@@ -34,41 +36,115 @@ except Exception:
 # -------------------------------------------------------
 # NOAA 데이터 로드 (캐시)
 # -------------------------------------------------------
-@st.cache_data
-def load_noaa_data():
-    url = "https://datahub.io/core/sea-level-rise/r/csiro_recons_gmsl_mo_2015.csv"
+NOAA_URL = "https://datahub.io/core/sea-level-rise/r/csiro_recons_gmsl_mo_2015.csv"
+NOAA_CACHE_PATH = Path.home() / ".cache" / "sea_level_app" / "noaa_gmsl.csv"  # 사용자별 캐시 위치
+NOAA_CACHE_MAX_AGE = timedelta(days=7)
+NOAA_COLUMN_ALIASES = {"Time": "date", "GMSL": "value", "date": "date", "value": "value"}
+_rng = np.random.default_rng(0)
+
+
+# NOAA CSV 원본 바이트 다운로드
+def _download_noaa_csv():
+    r = requests.get(NOAA_URL, timeout=10)
+    r.raise_for_status()
+    return r.content
+
+
+# 파싱에 성공한 CSV만 디스크 캐시에 저장 (임시 파일에 쓴 뒤 교체)
+def _save_noaa_cache(content):
+    tmp_path = None
     try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        df = pd.read_csv(StringIO(r.text))
-
-        # 컬럼명 정리 (데이터셋에 따라 컬럼명이 다를 수 있어서 보정)
-        if "Time" in df.columns and "GMSL" in df.columns:
-            df = df.rename(columns={"Time": "date", "GMSL": "value"})
-        elif "date" in df.columns and "value" in df.columns:
-            pass
-        else:
-            # fallback: 첫 두 컬럼을 date/value로 가정
-            cols = df.columns.tolist()
-            if len(cols) >= 2:
-                df = df.rename(columns={cols[0]: "date", cols[1]: "value"})
-
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df = df.dropna(subset=["date", "value"])
-        df = df[df["date"] <= datetime.today()]  # 미래 데이터 제거
-        df["year"] = df["date"].dt.year
-        return df
+        NOAA_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        # 실행마다 고유한 임시 파일을 써서 동시 갱신끼리 덮어쓰지 않도록 함
+        with tempfile.NamedTemporaryFile(dir=NOAA_CACHE_PATH.parent, prefix="noaa_gmsl_", suffix=".tmp", delete=False) as f:
+            tmp_path = Path(f.name)
+            f.write(content)
+        tmp_path.replace(NOAA_CACHE_PATH)
+    except OSError:
+        # 디스크에 쓸 수 없어도 받은 데이터는 그대로 사용
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+
+
+# CSV를 date/value 컬럼의 월별 데이터로 정리 (유효한 행이 없으면 ValueError)
+def _parse_noaa_csv(source):
+    df = pd.read_csv(source)
+
+    # 컬럼명 정리 (데이터셋에 따라 컬럼명이 다를 수 있어서 보정)
+    df.columns = [NOAA_COLUMN_ALIASES.get(c, c) for c in df.columns]
+    if not {"date", "value"} <= set(df.columns) and len(df.columns) >= 2:
+        # fallback: 첫 두 컬럼을 date/value로 가정
+        df.columns = ["date", "value"] + list(df.columns[2:])
+
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df = df.dropna(subset=["date", "value"])
+    df = df[df["date"] <= datetime.today()]  # 미래 데이터 제거
+    if df.empty:
+        raise ValueError("NOAA CSV에 유효한 데이터가 없습니다")
+    df["year"] = df["date"].dt.year.astype(np.int16)
+    return df.drop(columns=["date"])
+
+
+# 스크립트 재실행·세션 간에 공유되는 갱신 잠금 (프로세스당 하나)
+@st.cache_resource
+def _noaa_refresh_lock():
+    return threading.Lock()
+
+
+# 백그라운드 스레드에서 디스크 캐시 갱신 (동시에 하나만 실행)
+def _refresh_noaa_cache(lock):
+    if not lock.acquire(blocking=False):
+        return
+    try:
+        content = _download_noaa_csv()
+        _parse_noaa_csv(BytesIO(content))
+        _save_noaa_cache(content)
     except Exception:
-        # 실패 시 예시 데이터 리턴
-        data = {
-            "date": pd.date_range("2000-01-01", periods=120, freq="M"),
-            "value": np.linspace(0, 80, 120) + np.random.normal(scale=1.5, size=120)
-        }
-        df = pd.DataFrame(data)
-        df["year"] = df["date"].dt.year
-        return df
+        pass  # 갱신 실패 시 기존 캐시를 계속 사용
+    finally:
+        lock.release()
+
+
+@st.cache_data(ttl=timedelta(days=1))
+def load_noaa_data():
+    # 디스크 캐시가 있으면 바로 사용하고, 오래됐으면 백그라운드에서 갱신
+    if NOAA_CACHE_PATH.exists():
+        try:
+            df = _parse_noaa_csv(NOAA_CACHE_PATH)
+        except Exception:
+            # 깨진 캐시는 지우고 아래에서 새로 받아옴
+            try:
+                NOAA_CACHE_PATH.unlink(missing_ok=True)
+            except OSError:
+                pass
+        else:
+            age = datetime.now() - datetime.fromtimestamp(NOAA_CACHE_PATH.stat().st_mtime)
+            if age > NOAA_CACHE_MAX_AGE:
+                threading.Thread(target=_refresh_noaa_cache, args=(_noaa_refresh_lock(),), daemon=True).start()
+            return df
+
+    # (문자열 디코딩 없이 바이트를 C 파서에 바로 전달, 파싱에 성공한 경우에만 저장)
+    content = _download_noaa_csv()
+    df = _parse_noaa_csv(BytesIO(content))
+    _save_noaa_cache(content)
+    return df
+
+
+# 예시 데이터 (st.cache_data에 저장되지 않도록 캐시 함수 밖에서 생성)
+def _sample_noaa_data():
+    data = {
+        "date": pd.date_range("2000-01-01", periods=120, freq="M"),
+        "value": np.linspace(0, 80, 120) + _rng.normal(scale=1.5, size=120)
+    }
+    df = pd.DataFrame(data)
+    df["year"] = df["date"].dt.year.astype(np.int16)
+    return df.drop(columns=["date"])
 
-df_monthly = load_noaa_data()
+try:
+    df_monthly = load_noaa_data()
+except Exception:
+    # 실패 시 예시 데이터 사용 (다음 실행에서 다시 로드 시도)
+    df_monthly = _sample_noaa_data()
 
 # -------------------------------------------------------
 # 사이드바: 분석 옵션
@@ -88,62 +164,130 @@ show_trend = st.sidebar.checkbox("추세선 표시 (선형)", value=True)
 # -------------------------------------------------------
 st.header("📊 전 세계 해수면 상승 추이 (연도별 평균 + 범위)")
 
-df_filtered = df_monthly[(df_monthly["year"] >= year_range[0]) & (df_monthly["year"] <= year_range[1])]
-df_yearly = df_filtered.groupby("year")["value"].agg(["mean", "min", "max"]).reset_index().sort_values("year")
-df_yearly = df_yearly.rename(columns={"mean": "avg"})
-
-# 이동평균 (년 단위)
-df_yearly["moving_avg"] = df_yearly["avg"].rolling(window=window, min_periods=1).mean()
-
-# 추세선 (선형 회귀)
-if len(df_yearly) >= 2:
-    coeffs = np.polyfit(df_yearly["year"].astype(float), df_yearly["avg"].astype(float), 1)
-    slope, intercept = coeffs[0], coeffs[1]
-    df_yearly["trend"] = df_yearly["year"] * slope + intercept
-else:
-    df_yearly["trend"] = df_yearly["avg"]
-
-# 막대 그래프 (평균) + 에러바(최솟값/최댓값)
-fig = px.bar(
-    df_yearly,
-    x="year",
-    y="avg",
-    error_y=(df_yearly["max"] - df_yearly["avg"]),
-    error_y_minus=(df_yearly["avg"] - df_yearly["min"]),
-    labels={"year": "연도", "avg": "해수면 높이 (mm)"},
-    title=f"연도별 평균 해수면 높이 ({year_range[0]} - {year_range[1]})"
-)
+@st.cache_data
+def compute_yearly(years_arr, values_arr, year_range, window):
+    # DataFrame 마스킹 대신 원시 배열에서 바로 기간 필터링
+    mask = (years_arr >= year_range[0]) & (years_arr <= year_range[1])
+    years = years_arr[mask]
+    vals = values_arr[mask].astype(np.float64, copy=False)
+
+    # 연도별 평균/최솟값/최댓값 (numpy 집계)
+    if years.size == 0:
+        empty = np.array([], dtype=float)
+        yearly = {k: empty for k in ["year", "avg", "min", "max", "moving_avg", "trend", "err_up", "err_dn"]}
+        return yearly, 0.0, 0.0
+
+    # 월별 데이터는 보통 연도순으로 들어오므로, 정렬이 필요할 때만 정렬
+    if np.all(years[1:] >= years[:-1]):
+        years_sorted, vals_sorted = years, vals
+    else:
+        order = np.argsort(years, kind="stable")
+        years_sorted, vals_sorted = years[order], vals[order]
+    group_starts = np.flatnonzero(np.r_[True, years_sorted[1:] != years_sorted[:-1]])
+    uniq_years = years_sorted[group_starts]
+
+    offset = years - years.min()
+    counts = np.bincount(offset)
+    sums = np.bincount(offset, weights=vals)
+    present = counts > 0
+    means = sums[present] / counts[present]
+    mins = np.minimum.reduceat(vals_sorted, group_starts)
+    maxs = np.maximum.reduceat(vals_sorted, group_starts)
+
+    # 이동평균 (년 단위, 구간 시작부는 가용한 연도만으로 평균)
+    n = len(means)
+    moving_sum = np.convolve(means, np.ones(window), mode="full")[:n]
+    moving_avg = moving_sum / np.minimum(np.arange(1, n + 1), window)
+
+    # 추세선 (선형 회귀)
+    slope, intercept = 0.0, 0.0
+    x = uniq_years.astype(np.float64)
+    if n >= 2:
+        # 1차 최소제곱 닫힌 해 (np.polyfit의 SVD 경로 생략)
+        xm, ym = x.mean(), means.mean()
+        slope = ((x - xm) * (means - ym)).sum() / ((x - xm) ** 2).sum()
+        intercept = ym - slope * xm
+        trend = intercept + slope * x
+    else:
+        trend = means
+
+    # DataFrame 컬럼 대입 없이 numpy 배열로 바로 반환
+    yearly = {
+        "year": uniq_years,
+        "avg": means,
+        "min": mins,
+        "max": maxs,
+        "moving_avg": moving_avg,
+        "trend": trend,
+        "err_up": maxs - means,
+        "err_dn": means - mins,
+    }
+    return yearly, slope, intercept
+
+years_arr = df_monthly["year"].to_numpy()
+values_arr = df_monthly["value"].to_numpy()
+
+yearly, slope, intercept = compute_yearly(years_arr, values_arr, year_range, window)
 
-# 이동평균 선 추가
-fig.add_trace(
-    go.Scatter(
-        x=df_yearly["year"],
-        y=df_yearly["moving_avg"],
+# 막대 그래프 (평균) + 에러바(최솟값/최댓값) + 이동평균/추세선
+years = yearly["year"].tolist()
+
+traces = [
+    go.Bar(
+        x=years,
+        y=yearly["avg"].tolist(),
+        showlegend=False,
+        hovertemplate="연도=%{x}<br>해수면 높이 (mm)=%{y}<extra></extra>",
+        error_y=dict(type="data", symmetric=False, array=yearly["err_up"].tolist(), arrayminus=yearly["err_dn"].tolist())
+    ),
+    go.Scattergl(
+        x=years,
+        y=yearly["moving_avg"].tolist(),
         mode="lines",
         name=f"{window}년 이동평균",
         line=dict(width=3, dash="dash")
     )
-)
+]
 
 # 추세선 추가 (옵션)
 if show_trend:
-    fig.add_trace(
-        go.Scatter(
-            x=df_yearly["year"],
-            y=df_yearly["trend"],
+    traces.append(
+        go.Scattergl(
+            x=years,
+            y=yearly["trend"].tolist(),
             mode="lines",
             name=f"선형 추세선 ({slope:.3f} mm/년)",
             line=dict(width=2, dash="dot")
         )
     )
 
-fig.update_layout(legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+# 트레이스와 레이아웃을 한 번에 넘겨 Figure 검증을 한 번만 수행
+fig = go.Figure(
+    data=traces,
+    layout=dict(
+        title=f"연도별 평균 해수면 높이 ({year_range[0]} - {year_range[1]})",
+        xaxis_title="연도",
+        yaxis_title="해수면 높이 (mm)",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+)
 
 st.plotly_chart(fig, use_container_width=True)
 
 # 데이터 다운로드 (연도별)
-csv = df_yearly.to_csv(index=False)
-st.download_button("📥 연도별 데이터 다운로드 (CSV)", csv, "sea_level_yearly.csv", mime="text/csv")
+# (집계와 같은 인자로 캐시해서 데이터가 바뀔 때만 CSV 인코딩)
+@st.cache_data
+def yearly_csv_bytes(years_arr, values_arr, year_range, window):
+    yearly, _, _ = compute_yearly(years_arr, values_arr, year_range, window)
+    df_yearly = pd.DataFrame({k: yearly[k] for k in ["year", "avg", "min", "max", "moving_avg", "trend"]})
+    return df_yearly.to_csv(index=False).encode("utf-8")
+
+st.download_button(
+    "📥 연도별 데이터 다운로드 (CSV)",
+    yearly_csv_bytes(years_arr, values_arr, year_range, window),
+    "sea_level_yearly.csv",
+    mime="text/csv"
+)
 
 # -------------------------------------------------------
 # 체크리스트 UI
@@ -164,31 +308,36 @@ missions = [
     "환경 다큐멘터리나 뉴스 관심 갖기"
 ]
 
-if "checked" not in st.session_state:
-    st.session_state.checked = [False] * len(missions)
-
-cols = st.columns(2)
-for i, mission in enumerate(missions):
-    with cols[i % 2]:
-        st.session_state.checked[i] = st.checkbox(mission, value=st.session_state.checked[i])
-
-completed = sum(st.session_state.checked)
-progress = completed / len(missions)
-progress_percent = int(progress * 100)
-
-# 프로그레스 바 (0~100)
-st.progress(progress_percent)
-st.write(f"실천 수: {completed}/{len(missions)}  ·  현재 달성률: **{progress_percent}%**")
-
-# 0% / 60% / 80% 피드백
-if progress_percent == 0:
-    st.warning("🙃 아직 하나도 체크하지 않았어요. 작은 것부터 하나씩 시작해봐요 — 시작이 반입니다!")
-elif progress_percent >= 80:
-    st.balloons()
-    st.success("🎉 멋져요! 80% 이상 달성했습니다 — 당신의 작은 실천이 큰 변화를 만듭니다!")
-elif progress_percent >= 60:
-    st.info("👍 잘하고 있어요! 조금만 더 하면 큰 변화를 만들 수 있어요 — 계속 응원합니다!")
-else:
-    st.info("💡 좋은 출발이에요. 꾸준히 이어가면 큰 변화를 만들 수 있어요.")
+def render_checklist(missions):
+    # 폼으로 묶어서 체크할 때마다가 아니라 '업데이트' 버튼을 누를 때만 다시 실행
+    # (체크 상태는 위젯 key로 Streamlit이 보관)
+    with st.form("checklist"):
+        cols = st.columns(2)
+        for i, mission in enumerate(missions):
+            cols[i % 2].checkbox(mission, key=f"m{i}")
+        submitted = st.form_submit_button("업데이트")
+
+    checked = np.fromiter((st.session_state[f"m{i}"] for i in range(len(missions))), dtype=bool, count=len(missions))
+    completed = int(checked.sum())
+    progress = completed / len(missions)
+    progress_percent = int(progress * 100)
+
+    # 프로그레스 바 (0~100)
+    st.progress(progress_percent)
+    st.write(f"실천 수: {completed}/{len(missions)}  ·  현재 달성률: **{progress_percent}%**")
+
+    # 0% / 60% / 80% 피드백
+    if progress_percent == 0:
+        st.warning("🙃 아직 하나도 체크하지 않았어요. 작은 것부터 하나씩 시작해봐요 — 시작이 반입니다!")
+    elif progress_percent >= 80:
+        if submitted:
+            st.balloons()
+        st.success("🎉 멋져요! 80% 이상 달성했습니다 — 당신의 작은 실천이 큰 변화를 만듭니다!")
+    elif progress_percent >= 60:
+        st.info("👍 잘하고 있어요! 조금만 더 하면 큰 변화를 만들 수 있어요 — 계속 응원합니다!")
+    else:
+        st.info("💡 좋은 출발이에요. 꾸준히 이어가면 큰 변화를 만들 수 있어요.")
+
+render_checklist(missions)
 
 # (선택) 추가 설명/저장 기능 등은 원하시면 더 붙여드릴게요.